@@ -3,13 +3,179 @@ PubMed Batch Fetcher
 A tool for fetching and organizing PubMed articles with token-aware batching.
 """
 
-from Bio import Entrez
+from lxml import etree
+from collections import deque
 from datetime import datetime, timedelta
+from functools import lru_cache
+import asyncio
+import html
+import io
+import queue
+import re
+import sqlite3
+import sys
+import threading
 import time
 import os
 import argparse
+import aiohttp
+import xxhash
+import numpy as np
+import requests
 import tiktoken
 
+try:
+    # Optional: only required for the default jsonl output format
+    import orjson
+    import zstandard as zstd
+except ImportError:
+    orjson = None
+    zstd = None
+from requests.adapters import HTTPAdapter
+from tqdm import tqdm
+
+EUTILS_BASE_URL = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils/"
+
+# The efetch response is huge, but we only need three fields per
+# article; compiled byte regexes extract them without building any tree.
+_PMID_RE = re.compile(rb'<PMID[^>]*>(\d+)</PMID>')
+_TITLE_RE = re.compile(rb'<ArticleTitle[^>]*>(.*?)</ArticleTitle>', re.DOTALL)
+# The plain <Abstract> element only; <OtherAbstract> (plain-language or
+# translated versions) must not leak into the extracted text
+_ABSTRACT_BLOCK_RE = re.compile(rb'<Abstract>(.*?)</Abstract>', re.DOTALL)
+_ABSTRACT_RE = re.compile(rb'<AbstractText[^>]*>(.*?)</AbstractText>', re.DOTALL)
+_TAG_RE = re.compile(rb'<[^>]+>')
+
+
+def _clean_fragment(raw):
+    """Strip inline markup and unescape entities from a captured field."""
+    return html.unescape(_TAG_RE.sub(b'', raw).decode('utf-8', 'replace')).strip()
+
+
+class _RateLimiter:
+    """Thread-safe sliding-window rate limiter for NCBI requests."""
+
+    def __init__(self, calls_per_second):
+        self.calls_per_second = calls_per_second
+        self._timestamps = deque()
+        self._lock = threading.Lock()
+
+    def wait(self):
+        """Block until another call is allowed under the rate limit."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                while self._timestamps and now - self._timestamps[0] >= 1.0:
+                    self._timestamps.popleft()
+                if len(self._timestamps) < self.calls_per_second:
+                    self._timestamps.append(now)
+                    return
+                delay = 1.0 - (now - self._timestamps[0])
+            time.sleep(max(delay, 0.01))
+
+
+class _AsyncRateLimiter:
+    """Event-loop rate limiter spacing requests evenly under a cap."""
+
+    def __init__(self, calls_per_second):
+        self._interval = 1.0 / calls_per_second
+        self._next_time = 0.0
+        self._lock = asyncio.Lock()
+
+    async def wait(self):
+        """Sleep until this caller's slot under the rate limit opens."""
+        async with self._lock:
+            now = time.monotonic()
+            delay = self._next_time - now
+            self._next_time = max(now, self._next_time) + self._interval
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+@lru_cache(maxsize=4)
+def _get_encoder(name="cl100k_base"):
+    """Load a tiktoken encoding once and share it across fetcher instances."""
+    return tiktoken.get_encoding(name)
+
+
+_TOKEN_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache",
+                                "pubmed_llm_fetcher")
+
+
+def _text_hash(text):
+    """xxhash64 of the text, shifted into sqlite's signed 64-bit range."""
+    return xxhash.xxh64_intdigest(text.encode('utf-8')) - (1 << 63)
+
+
+def _open_token_cache():
+    """Open (creating if needed) the on-disk token-count cache."""
+    os.makedirs(_TOKEN_CACHE_DIR, exist_ok=True)
+    conn = sqlite3.connect(os.path.join(_TOKEN_CACHE_DIR, "tokens.sqlite"),
+                           isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS token_cache ("
+        "hash INTEGER PRIMARY KEY, "
+        "token_count INTEGER NOT NULL, "
+        "word_count INTEGER NOT NULL)"
+    )
+    return conn
+
+
+def _find_batch_boundaries(token_counts, token_limit):
+    """
+    Find the indices at which a new batch must start so that no batch
+    exceeds token_limit (single oversize articles get their own batch).
+
+    Args:
+        token_counts (np.ndarray): Per-article token counts (int32)
+        token_limit (int): Maximum tokens per batch
+
+    Returns:
+        np.ndarray: Indices into the article list where each new batch
+            begins
+    """
+    out = np.empty(token_counts.size, np.int32)
+    n = 0
+    running_sum = 0
+    for i in range(token_counts.size):
+        count = token_counts[i]
+        if running_sum + count > token_limit and running_sum > 0:
+            out[n] = i
+            n += 1
+            running_sum = count
+        else:
+            running_sum += count
+    return out[:n]
+
+
+try:
+    # JIT-compile the boundary walk when numba is available; the plain
+    # loop only matters for very large (10k+ article) runs, so numba
+    # stays optional.
+    from numba import njit
+    _find_batch_boundaries = njit(cache=True)(_find_batch_boundaries)
+except ImportError:
+    pass
+
+
+@lru_cache(maxsize=4)
+def _word_start_table(name="cl100k_base"):
+    """
+    Boolean lookup of which token IDs start a new word (decode to bytes
+    beginning with whitespace). Built once per encoding and cached.
+    """
+    encoder = _get_encoder(name)
+    table = np.zeros(encoder.n_vocab, dtype=bool)
+    for token_id in range(encoder.n_vocab):
+        try:
+            first_byte = encoder.decode_single_token_bytes(token_id)[:1]
+        except KeyError:
+            # Unallocated IDs in the vocab range
+            continue
+        table[token_id] = first_byte in (b' ', b'\t', b'\n')
+    return table
+
 
 class PubMedFetcher:
     """
@@ -22,13 +188,16 @@ class PubMedFetcher:
         token_limit (int): Maximum tokens per batch
         output_dir (str): Directory for output files
         review_only (bool): Whether to fetch only review articles
+        output_format (str): Batch file format, 'jsonl' (zstd-compressed
+            JSON lines) or 'txt' (plain text)
     """
-    
-    def __init__(self, email, api_key, query, years=5, max_results=100, 
-                 token_limit=8000, output_dir="./pubmed_output", review_only=False):
+
+    def __init__(self, email, api_key, query, years=5, max_results=100,
+                 token_limit=8000, output_dir="./pubmed_output", review_only=False,
+                 output_format="jsonl"):
         """
         Initialize the PubMed fetcher.
-        
+
         Args:
             email (str): Email for NCBI Entrez (required)
             api_key (str): NCBI API key (optional but recommended)
@@ -38,21 +207,44 @@ class PubMedFetcher:
             token_limit (int): Token limit per batch (default: 8000)
             output_dir (str): Output directory path
             review_only (bool): Fetch only review articles (default: False)
+            output_format (str): 'jsonl' for compressed .jsonl.zst batch
+                files or 'txt' for plain text (default: 'jsonl')
         """
-        # Set Entrez credentials
-        Entrez.email = email
-        if api_key:
-            Entrez.api_key = api_key
-        
+        if output_format not in ("jsonl", "txt"):
+            raise ValueError(f"Unsupported output format: {output_format}")
+        if output_format == "jsonl" and (orjson is None or zstd is None):
+            raise ImportError(
+                "The jsonl output format requires the orjson and zstandard "
+                "packages; install them or use output_format='txt'"
+            )
+
+        self.email = email
+        self.api_key = api_key
+
+        # Pooled keep-alive session so each E-utilities request reuses
+        # one TCP+TLS connection instead of handshaking per call
+        self._session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=16, pool_maxsize=16)
+        self._session.mount('https://', adapter)
+
         self.query = query
         self.years = years
+
+        # NCBI allows 10 req/s with an API key, 3 req/s without; stay
+        # just under each limit.
+        self._rate_limiter = _RateLimiter(9 if api_key else 2.5)
         self.max_results = max_results
         self.token_limit = token_limit
         self.output_dir = output_dir
         self.review_only = review_only
+        self.output_format = output_format
 
         # Initialize tokenizer for GPT-4/3.5-turbo
-        self.tokenizer = tiktoken.get_encoding("cl100k_base")
+        self.tokenizer = _get_encoder("cl100k_base")
+
+        # Persistent token-count cache so repeat runs over overlapping
+        # queries skip re-tokenizing the same abstracts
+        self._token_cache = _open_token_cache()
 
         # Statistics
         self.total_articles = 0
@@ -64,8 +256,10 @@ class PubMedFetcher:
         # Create output directory
         os.makedirs(output_dir, exist_ok=True)
 
-        # Initialize log file
+        # Initialize log file (one persistent buffered handle instead of
+        # open/write/close per message)
         self.log_file = os.path.join(output_dir, "fetch_log.txt")
+        self._log_fh = open(self.log_file, 'a', encoding='utf-8', buffering=65536)
         self._log(f"PubMed Fetcher initialized at {datetime.now()}")
         self._log(f"Query: {query}")
         self._log(f"Date range: Last {years} year(s)")
@@ -73,18 +267,49 @@ class PubMedFetcher:
         self._log(f"Review articles only: {review_only}")
         self._log(f"Token limit per batch: {token_limit}")
 
-    def _log(self, message):
+    def _log(self, message, flush=False):
         """Log messages to file and console."""
         print(message)
-        with open(self.log_file, 'a', encoding='utf-8') as f:
-            f.write(f"{message}\n")
+        self._log_fh.write(f"{message}\n")
+        if flush:
+            self._log_fh.flush()
+
+    def close(self):
+        """Flush and close the log file handle and the token cache."""
+        if not self._log_fh.closed:
+            self._log_fh.flush()
+            self._log_fh.close()
+        self._token_cache.close()
+        self._session.close()
+
+    def _eutils_request(self, endpoint, params):
+        """
+        POST to an E-utilities endpoint over the pooled session.
+
+        Args:
+            endpoint (str): E-utilities script name (e.g. 'efetch.fcgi')
+            params (dict): Query parameters for the endpoint
+
+        Returns:
+            file-like: Raw response stream suitable for lxml parsing
+        """
+        data = {'tool': 'pubmed_llm_fetcher', 'email': self.email}
+        if self.api_key:
+            data['api_key'] = self.api_key
+        data.update(params)
+
+        response = self._session.post(EUTILS_BASE_URL + endpoint, data=data,
+                                      stream=True, timeout=60)
+        response.raise_for_status()
+        response.raw.decode_content = True
+        return response.raw
 
     def search_pubmed(self):
         """
-        Search PubMed and return list of PMIDs.
-        
+        Search PubMed and return PMIDs plus the Entrez history session.
+
         Returns:
-            list: List of PubMed IDs (PMIDs)
+            tuple: (list of PMIDs, WebEnv string, QueryKey string)
         """
         end_date = datetime.now()
         start_date = end_date - timedelta(days=365 * self.years)
@@ -103,103 +328,217 @@ class PubMedFetcher:
         self._log(f"Effective query: {search_query}")
 
         try:
-            handle = Entrez.esearch(
-                db="pubmed",
-                term=search_query,
-                mindate=mindate,
-                maxdate=maxdate,
-                datetype="pdat",
-                retmax=self.max_results,
-                usehistory="y"
-            )
+            self._rate_limiter.wait()
+            handle = self._eutils_request('esearch.fcgi', {
+                'db': 'pubmed',
+                'term': search_query,
+                'mindate': mindate,
+                'maxdate': maxdate,
+                'datetype': 'pdat',
+                'retmax': self.max_results,
+                'usehistory': 'y'
+            })
 
-            record = Entrez.read(handle)
-            handle.close()
+            root = etree.parse(handle).getroot()
 
-            pmid_list = record["IdList"]
-            total_count = int(record["Count"])
+            pmid_list = [id_elem.text for id_elem in root.iterfind('IdList/Id')]
+            total_count = int(root.findtext('Count'))
+            webenv = root.findtext('WebEnv')
+            query_key = root.findtext('QueryKey')
 
             self._log(f"Total articles found: {total_count}")
             self._log(f"Retrieving: {len(pmid_list)} articles")
 
-            return pmid_list
+            return pmid_list, webenv, query_key
 
         except Exception as e:
-            self._log(f"ERROR during search: {e}")
-            return []
+            self._log(f"ERROR during search: {e}", flush=True)
+            return [], None, None
 
-    def fetch_articles(self, pmid_list):
+    def _parse_efetch_xml(self, payload):
         """
-        Fetch article details (title and abstract only).
-        
+        Extract pmid/title/abstract from one efetch XML response.
+
         Args:
-            pmid_list (list): List of PubMed IDs
-            
+            payload (bytes): Raw efetch XML
+
         Returns:
-            list: List of article dictionaries with pmid, title, and abstract
+            tuple: (list of article dicts, number of skipped articles)
         """
         articles = []
+        skipped = 0
+
+        # Split on the full article tag (the closing '>' keeps
+        # <PubmedArticleSet> from producing a phantom first chunk) and
+        # pull the three fields with compiled regexes on the raw bytes —
+        # no tree build at all.
+        for chunk in payload.split(b'<PubmedArticle>')[1:]:
+            pmid_match = _PMID_RE.search(chunk)
+            if pmid_match is None:
+                # Not an article record; don't count it as skipped
+                continue
+            pmid = pmid_match.group(1).decode('ascii')
+
+            title_match = _TITLE_RE.search(chunk)
+            title = _clean_fragment(title_match.group(1)) if title_match else ''
+
+            abstract_block = _ABSTRACT_BLOCK_RE.search(chunk)
+            abstract = ' '.join(
+                _clean_fragment(part)
+                for part in _ABSTRACT_RE.findall(abstract_block.group(1))
+            ).strip() if abstract_block else ''
+
+            if not abstract:
+                self._log(f"WARNING: No abstract for PMID {pmid} - skipping")
+                skipped += 1
+                continue
+
+            articles.append({
+                'pmid': pmid,
+                'title': title,
+                'abstract': abstract
+            })
+
+        return articles, skipped
+
+    async def _fetch_one_batch(self, session, limiter, webenv, query_key,
+                               retstart, retmax):
+        """
+        Fetch and parse one batch from the Entrez history server
+        (rate-limited).
+
+        Args:
+            session (aiohttp.ClientSession): Shared HTTP session
+            limiter (_AsyncRateLimiter): Shared request rate limiter
+            webenv (str): Entrez WebEnv from the search
+            query_key (str): Entrez QueryKey from the search
+            retstart (int): Offset of this batch in the result set
+            retmax (int): Number of articles in this batch
+
+        Returns:
+            tuple: (list of article dicts, number of skipped articles)
+        """
+        await limiter.wait()
+
+        # Reference the history server instead of re-sending PMID lists,
+        # which balloon the URL and risk HTTP 414 for large result sets.
+        data = {
+            'db': 'pubmed',
+            'WebEnv': webenv,
+            'query_key': query_key,
+            'retstart': str(retstart),
+            'retmax': str(retmax),
+            'retmode': 'xml',
+            'tool': 'pubmed_llm_fetcher',
+            'email': self.email
+        }
+        if self.api_key:
+            data['api_key'] = self.api_key
+
+        async with session.post(EUTILS_BASE_URL + 'efetch.fcgi',
+                                data=data) as response:
+            response.raise_for_status()
+            payload = await response.read()
+
+        return self._parse_efetch_xml(payload)
+
+    async def _fetch_all_batches(self, offsets, batch_size, total,
+                                 webenv, query_key, sink=None):
+        """
+        Fan out all efetch batches over one aiohttp session.
+
+        If sink is given, completed batches are put on it (blocking when
+        it is full, which backpressures the downloads) instead of being
+        collected into the returned list.
+        """
+        limiter = _AsyncRateLimiter(9 if self.api_key else 2.5)
+        articles = []
+
+        # tqdm rate-limits its own redraws, so progress costs no disk
+        # writes no matter how fast batches complete.
+        progress = tqdm(total=total, desc="fetching", unit="article",
+                        file=sys.stderr, mininterval=0.5)
+
+        connector = aiohttp.TCPConnector(limit=16)
+        async with aiohttp.ClientSession(connector=connector) as session:
+            tasks = [
+                asyncio.create_task(
+                    self._fetch_one_batch(session, limiter, webenv,
+                                          query_key, offset, batch_size)
+                )
+                for offset in offsets
+            ]
+
+            for task in asyncio.as_completed(tasks):
+                try:
+                    batch_articles, skipped = await task
+                except Exception as e:
+                    self._log(f"ERROR fetching batch: {e}", flush=True)
+                    continue
+
+                self.skipped_articles += skipped
+                progress.update(len(batch_articles) + skipped)
+
+                if sink is not None:
+                    # Hand off via a worker thread: a blocking put on a
+                    # full queue must suspend only this coroutine, not
+                    # freeze the loop and every in-flight response.
+                    await asyncio.to_thread(sink.put, batch_articles)
+                else:
+                    articles.extend(batch_articles)
+
+        progress.close()
+        return articles
+
+    def fetch_articles(self, pmid_list, webenv, query_key):
+        """
+        Fetch article details (title and abstract only), tokenizing each
+        batch while the next one downloads.
+
+        Args:
+            pmid_list (list): List of PubMed IDs (used for progress totals)
+            webenv (str): Entrez WebEnv from the search
+            query_key (str): Entrez QueryKey from the search
+
+        Returns:
+            list: List of article dictionaries with pmid, title, abstract,
+                word_count, and token_count
+        """
         batch_size = 50  # Fetch 50 articles at a time
 
         self._log("\n" + "="*60)
         self._log("FETCHING ARTICLE DETAILS...")
         self._log("="*60)
 
-        for i in range(0, len(pmid_list), batch_size):
-            batch_pmids = pmid_list[i:i + batch_size]
+        offsets = list(range(0, len(pmid_list), batch_size))
+        fetch_q = queue.Queue(maxsize=4)
 
+        def _producer():
+            """Run the async fan-out, feeding batches into the queue."""
             try:
-                handle = Entrez.efetch(
-                    db="pubmed",
-                    id=",".join(batch_pmids),
-                    rettype="xml",
-                    retmode="xml"
+                asyncio.run(
+                    self._fetch_all_batches(offsets, batch_size,
+                                            len(pmid_list), webenv,
+                                            query_key, sink=fetch_q)
                 )
+            finally:
+                fetch_q.put(None)  # sentinel: no more batches
 
-                records = Entrez.read(handle)
-                handle.close()
-
-                for article_record in records['PubmedArticle']:
-                    try:
-                        pmid = str(article_record['MedlineCitation']['PMID'])
-
-                        # Extract title
-                        title = article_record['MedlineCitation']['Article']['ArticleTitle']
-
-                        # Extract abstract
-                        abstract_data = article_record['MedlineCitation']['Article'].get('Abstract')
-                        if abstract_data and 'AbstractText' in abstract_data:
-                            abstract_parts = abstract_data['AbstractText']
-                            if isinstance(abstract_parts, list):
-                                abstract = " ".join([str(part) for part in abstract_parts])
-                            else:
-                                abstract = str(abstract_parts)
-                        else:
-                            self._log(f"WARNING: No abstract for PMID {pmid} - skipping")
-                            self.skipped_articles += 1
-                            continue
-
-                        articles.append({
-                            'pmid': pmid,
-                            'title': title,
-                            'abstract': abstract
-                        })
-
-                    except KeyError as e:
-                        self._log(f"WARNING: Missing data for article - {e}")
-                        self.skipped_articles += 1
-                        continue
-
-                # Progress update
-                processed = min(i + batch_size, len(pmid_list))
-                self._log(f"Processed {processed}/{len(pmid_list)} articles")
-
-                # Be nice to NCBI servers
-                time.sleep(0.34)
-
-            except Exception as e:
-                self._log(f"ERROR fetching batch {i//batch_size + 1}: {e}")
-                continue
+        producer = threading.Thread(target=_producer, daemon=True)
+        producer.start()
+
+        # Consume on the main thread: tokenize batch N while the
+        # producer downloads batch N+1, so wall time approaches
+        # max(fetch, tokenize) instead of their sum.
+        articles = []
+        while True:
+            batch_articles = fetch_q.get()
+            if batch_articles is None:
+                break
+            self._annotate_articles(batch_articles)
+            articles.extend(batch_articles)
+
+        producer.join()
 
         self._log(f"\nSuccessfully fetched: {len(articles)} articles")
         self._log(f"Skipped (no abstract): {self.skipped_articles} articles")
@@ -214,81 +553,181 @@ class PubMedFetcher:
         """Count words in text."""
         return len(text.split())
 
-    def process_and_batch_articles(self, articles):
+    def _cached_counts(self, hashes):
         """
-        Process articles and create token-limited batches.
-        
+        Batch-read cached (token_count, word_count) pairs.
+
         Args:
-            articles (list): List of article dictionaries
+            hashes (list): Text hashes to look up
+
+        Returns:
+            dict: hash -> (token_count, word_count) for cache hits
         """
-        self._log("\n" + "="*60)
-        self._log("PROCESSING ARTICLES AND CREATING BATCHES...")
-        self._log("="*60)
+        found = {}
+        # Chunk the IN clause to stay under sqlite's bound-variable limit
+        for i in range(0, len(hashes), 500):
+            chunk = hashes[i:i + 500]
+            placeholders = ",".join("?" * len(chunk))
+            rows = self._token_cache.execute(
+                f"SELECT hash, token_count, word_count FROM token_cache "
+                f"WHERE hash IN ({placeholders})", chunk
+            )
+            for h, token_count, word_count in rows:
+                found[h] = (token_count, word_count)
+        return found
 
-        current_batch = []
-        current_batch_tokens = 0
-        batch_number = 1
+    def _annotate_articles(self, articles):
+        """
+        Attach word_count and token_count to each article in place.
 
-        for idx, article in enumerate(articles, 1):
-            # Combine title and abstract
-            combined_text = f"{article['title']} {article['abstract']}"
+        Args:
+            articles (list): Article dictionaries to annotate
+        """
+        # Plain + concatenation skips the f-string formatting machinery;
+        # both fields are already str
+        texts = [article['title'] + ' ' + article['abstract']
+                 for article in articles]
+
+        # Check the on-disk cache first; only cache misses get tokenized.
+        hashes = [_text_hash(text) for text in texts]
+        cached = self._cached_counts(hashes)
+
+        # Articles so long they cannot fit in a batch anyway get an
+        # estimated count instead of a full BPE pass: English runs at
+        # 3+ characters per token, so len/3 over- rather than
+        # under-estimates and still forces the article into its own
+        # batch. Estimates are kept out of the cache.
+        miss_indices = []
+        for i, h in enumerate(hashes):
+            if h in cached:
+                continue
+            text = texts[i]
+            if len(text) > self.token_limit * 3:
+                articles[i]['oversize'] = True
+                cached[h] = (len(text) // 3, self.count_words(text))
+            else:
+                miss_indices.append(i)
+
+        # Tokenize all cache misses in one call so tiktoken can
+        # parallelize internally instead of crossing into Rust once per
+        # article. encode_ordinary skips the special-token scan, which
+        # abstracts never contain.
+        miss_token_lists = self.tokenizer.encode_ordinary_batch(
+            [texts[i] for i in miss_indices], num_threads=os.cpu_count() or 1
+        )
+        word_start = _word_start_table("cl100k_base")
+
+        new_rows = []
+        for i, token_ids in zip(miss_indices, miss_token_lists):
+            # Approximate words from the tokens we already have: count
+            # word-starting tokens plus one for the leading word. Avoids
+            # re-scanning every string with str.split().
+            word_count = int(word_start[token_ids].sum()) + 1 if token_ids else 0
+            cached[hashes[i]] = (len(token_ids), word_count)
+            new_rows.append((hashes[i], len(token_ids), word_count))
+
+        if new_rows:
+            self._token_cache.executemany(
+                "INSERT OR REPLACE INTO token_cache "
+                "(hash, token_count, word_count) VALUES (?, ?, ?)",
+                new_rows
+            )
 
-            # Count words and tokens
-            word_count = self.count_words(combined_text)
-            token_count = self.count_tokens(combined_text)
+        for article, h in zip(articles, hashes):
+            token_count, word_count = cached[h]
 
-            # Update totals
             self.total_words += word_count
             self.total_tokens += token_count
 
-            # Store article with metrics
             article['word_count'] = word_count
             article['token_count'] = token_count
 
-            # Check if adding this article exceeds token limit
-            if current_batch_tokens + token_count > self.token_limit and current_batch:
-                # Save current batch
-                self._save_batch(current_batch, batch_number, current_batch_tokens)
-                self.batches.append({
-                    'batch_number': batch_number,
-                    'article_count': len(current_batch),
-                    'token_count': current_batch_tokens
-                })
-
-                # Start new batch
-                current_batch = [article]
-                current_batch_tokens = token_count
-                batch_number += 1
-            else:
-                # Add to current batch
-                current_batch.append(article)
-                current_batch_tokens += token_count
-
-            # Progress update
-            if idx % 10 == 0:
-                self._log(f"Processed {idx}/{len(articles)} articles")
+    def process_and_batch_articles(self, articles):
+        """
+        Process articles and create token-limited batches.
+        
+        Args:
+            articles (list): List of article dictionaries
+        """
+        self._log("\n" + "="*60)
+        self._log("PROCESSING ARTICLES AND CREATING BATCHES...")
+        self._log("="*60)
 
-        # Save final batch
-        if current_batch:
-            self._save_batch(current_batch, batch_number, current_batch_tokens)
+        # Articles coming from fetch_articles are already annotated;
+        # only tokenize whatever arrived without counts.
+        pending = [a for a in articles if 'token_count' not in a]
+        if pending:
+            self._annotate_articles(pending)
+
+        # Single pass over the count array to find batch boundaries,
+        # then slice the article list per batch.
+        token_counts = np.asarray([a['token_count'] for a in articles],
+                                  dtype=np.int32)
+        boundaries = _find_batch_boundaries(token_counts, self.token_limit)
+
+        starts = [0] + list(boundaries)
+        ends = list(boundaries) + [len(articles)]
+
+        batch_spans = tqdm(zip(starts, ends), total=len(starts),
+                           desc="batching", unit="batch",
+                           file=sys.stderr, mininterval=0.5)
+        for batch_number, (start, end) in enumerate(batch_spans, 1):
+            batch = articles[start:end]
+            if not batch:
+                continue
+            batch_tokens = int(token_counts[start:end].sum())
+            self._save_batch(batch, batch_number, batch_tokens)
             self.batches.append({
                 'batch_number': batch_number,
-                'article_count': len(current_batch),
-                'token_count': current_batch_tokens
+                'article_count': len(batch),
+                'token_count': batch_tokens
             })
 
         self.total_articles = len(articles)
+        self._log(f"Batched {len(articles)} articles into "
+                  f"{len(self.batches)} batches")
+
+    def _batch_filename(self, batch_number):
+        """Return the output path for a batch in the configured format."""
+        extension = "jsonl.zst" if self.output_format == "jsonl" else "txt"
+        return os.path.join(self.output_dir,
+                            f"pubmed_batch_{batch_number}.{extension}")
 
     def _save_batch(self, batch, batch_number, token_count):
-        """Save a batch of articles to a text file."""
-        filename = os.path.join(self.output_dir, f"pubmed_batch_{batch_number}.txt")
+        """Save a batch of articles in the configured output format."""
+        filename = self._batch_filename(batch_number)
+
+        if self.output_format == "jsonl":
+            # One article per line, zstd-compressed: far smaller on
+            # abstract text and cheap for downstream pipelines to
+            # stream back in.
+            with open(filename, 'wb') as raw, \
+                    zstd.ZstdCompressor(level=3).stream_writer(raw) as writer:
+                for article in batch:
+                    writer.write(orjson.dumps({
+                        'pmid': article['pmid'],
+                        'title': article['title'],
+                        'abstract': article['abstract']
+                    }) + b'\n')
+        else:
+            # One joined string and one write call per batch instead of
+            # several small writes per article.
+            body = "".join(
+                f"PMID: {article['pmid']}\n\n"
+                f"TITLE: {article['title']}\n\n"
+                f"ABSTRACT:\n{article['abstract']}\n\n"
+                f"{'-' * 40}\n\n"
+                for article in batch
+            )
 
-        with open(filename, 'w', encoding='utf-8') as f:
-            for article in batch:
-                f.write(f"PMID: {article['pmid']}\n\n")
-                f.write(f"TITLE: {article['title']}\n\n")
-                f.write(f"ABSTRACT:\n{article['abstract']}\n\n")
-                f.write("-" * 40 + "\n\n")
+            # Explicit 1MB binary buffer under the text wrapper, so the
+            # kernel sees one large write per megabyte of output even
+            # when batches are concatenated across many runs.
+            with open(filename, 'wb', buffering=1 << 20) as raw:
+                writer = io.TextIOWrapper(raw, encoding='utf-8',
+                                          write_through=False)
+                writer.write(body)
+                writer.flush()
 
         self._log(f"Saved batch {batch_number}: {len(batch)} articles, "
                  f"{token_count} tokens -> {filename}")
@@ -297,47 +736,56 @@ class PubMedFetcher:
         """Save summary statistics to file."""
         summary_file = os.path.join(self.output_dir, "summary.txt")
 
+        # Assemble the whole summary in memory and write it atomically
+        # with a single call instead of dozens of small writes.
+        parts = []
+        parts.append("="*60 + "\n")
+        parts.append("PUBMED FETCH SUMMARY\n")
+        parts.append("="*60 + "\n\n")
+
+        parts.append(f"Search Query: {self.query}\n")
+        parts.append(f"Review Articles Only: {self.review_only}\n")
+        parts.append(f"Date Range: Last {self.years} year(s)\n")
+        parts.append(f"Fetch Date: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n\n")
+
+        parts.append("-"*60 + "\n")
+        parts.append("FETCH STATISTICS\n")
+        parts.append("-"*60 + "\n")
+        parts.append(f"Total articles fetched: {self.total_articles}\n")
+        parts.append(f"Articles skipped (no abstract): {self.skipped_articles}\n")
+        parts.append(f"Total batches created: {len(self.batches)}\n\n")
+
+        parts.append("-"*60 + "\n")
+        parts.append("TOKEN & WORD METRICS\n")
+        parts.append("-"*60 + "\n")
+        parts.append(f"Total words: {self.total_words:,}\n")
+        parts.append(f"Total tokens: {self.total_tokens:,}\n")
+        if self.total_articles > 0:
+            parts.append(f"Average words per article: {self.total_words // self.total_articles}\n")
+            parts.append(f"Average tokens per article: {self.total_tokens // self.total_articles}\n\n")
+
+        parts.append("-"*60 + "\n")
+        parts.append("BATCH DISTRIBUTION\n")
+        parts.append("-"*60 + "\n")
+        parts.extend(
+            f"Batch {batch['batch_number']}: {batch['article_count']} articles, "
+            f"{batch['token_count']:,} tokens\n"
+            for batch in self.batches
+        )
+
+        parts.append("\n" + "-"*60 + "\n")
+        parts.append("OUTPUT FILES\n")
+        parts.append("-"*60 + "\n")
+        parts.append(f"Output directory: {self.output_dir}\n")
+        parts.extend(
+            f"  - {os.path.basename(self._batch_filename(i))}\n"
+            for i in range(1, len(self.batches) + 1)
+        )
+        parts.append("  - summary.txt\n")
+        parts.append("  - fetch_log.txt\n")
+
         with open(summary_file, 'w', encoding='utf-8') as f:
-            f.write("="*60 + "\n")
-            f.write("PUBMED FETCH SUMMARY\n")
-            f.write("="*60 + "\n\n")
-
-            f.write(f"Search Query: {self.query}\n")
-            f.write(f"Review Articles Only: {self.review_only}\n")
-            f.write(f"Date Range: Last {self.years} year(s)\n")
-            f.write(f"Fetch Date: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n\n")
-
-            f.write("-"*60 + "\n")
-            f.write("FETCH STATISTICS\n")
-            f.write("-"*60 + "\n")
-            f.write(f"Total articles fetched: {self.total_articles}\n")
-            f.write(f"Articles skipped (no abstract): {self.skipped_articles}\n")
-            f.write(f"Total batches created: {len(self.batches)}\n\n")
-
-            f.write("-"*60 + "\n")
-            f.write("TOKEN & WORD METRICS\n")
-            f.write("-"*60 + "\n")
-            f.write(f"Total words: {self.total_words:,}\n")
-            f.write(f"Total tokens: {self.total_tokens:,}\n")
-            if self.total_articles > 0:
-                f.write(f"Average words per article: {self.total_words // self.total_articles}\n")
-                f.write(f"Average tokens per article: {self.total_tokens // self.total_articles}\n\n")
-
-            f.write("-"*60 + "\n")
-            f.write("BATCH DISTRIBUTION\n")
-            f.write("-"*60 + "\n")
-            for batch in self.batches:
-                f.write(f"Batch {batch['batch_number']}: {batch['article_count']} articles, "
-                       f"{batch['token_count']:,} tokens\n")
-
-            f.write("\n" + "-"*60 + "\n")
-            f.write("OUTPUT FILES\n")
-            f.write("-"*60 + "\n")
-            f.write(f"Output directory: {self.output_dir}\n")
-            for i in range(1, len(self.batches) + 1):
-                f.write(f"  - pubmed_batch_{i}.txt\n")
-            f.write(f"  - summary.txt\n")
-            f.write(f"  - fetch_log.txt\n")
+            f.write("".join(parts))
 
         self._log(f"\nSummary saved to: {summary_file}")
 
@@ -360,26 +808,29 @@ class PubMedFetcher:
 
     def run(self):
         """Main execution flow."""
-        # Step 1: Search PubMed
-        pmid_list = self.search_pubmed()
-        if not pmid_list:
-            self._log("No results found. Exiting.")
-            return
+        try:
+            # Step 1: Search PubMed
+            pmid_list, webenv, query_key = self.search_pubmed()
+            if not pmid_list:
+                self._log("No results found. Exiting.")
+                return
 
-        # Step 2: Fetch articles
-        articles = self.fetch_articles(pmid_list)
-        if not articles:
-            self._log("No articles fetched. Exiting.")
-            return
+            # Step 2: Fetch articles
+            articles = self.fetch_articles(pmid_list, webenv, query_key)
+            if not articles:
+                self._log("No articles fetched. Exiting.")
+                return
 
-        # Step 3: Process and batch articles
-        self.process_and_batch_articles(articles)
+            # Step 3: Process and batch articles
+            self.process_and_batch_articles(articles)
 
-        # Step 4: Save summary
-        self.save_summary()
+            # Step 4: Save summary
+            self.save_summary()
 
-        # Step 5: Print final summary
-        self.print_summary()
+            # Step 5: Print final summary
+            self.print_summary()
+        finally:
+            self.close()
 
 
 def main():
@@ -417,8 +868,12 @@ Examples:
                        help='Token limit per batch (default: 8000)')
     parser.add_argument('--output-dir', type=str, default='./pubmed_output', 
                        help='Output directory (default: ./pubmed_output)')
-    parser.add_argument('--review-only', action='store_true', 
+    parser.add_argument('--review-only', action='store_true',
                        help='Fetch only review articles')
+    parser.add_argument('--format', type=str, choices=['jsonl', 'txt'],
+                       default='jsonl', dest='output_format',
+                       help='Batch file format: zstd-compressed JSONL or '
+                            'plain text (default: jsonl)')
 
     args = parser.parse_args()
 
@@ -430,7 +885,8 @@ Examples:
         max_results=args.max_results,
         token_limit=args.token_limit,
         output_dir=args.output_dir,
-        review_only=args.review_only
+        review_only=args.review_only,
+        output_format=args.output_format
     )
 
     fetcher.run()